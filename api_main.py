@@ -1,8 +1,16 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
 from pydantic_core import ValidationError as PydanticValidationError
 
-from db.session import db_cursor
-from db.connection import CONNECTION_STRING
+from db.session import db_connection, db_cursor
+from db.connection import close_pool, get_settings, warm_up_connection
 
 from app.schemas.api import ConvertRequest, ConvertResponse, APIUsage
 from app.utils.errors import ValidationError as AppValidationError, MappingError, DownstreamError
@@ -10,25 +18,70 @@ from app.utils.errors import ValidationError as AppValidationError, MappingError
 from app.schemas.nooko_recipe_output import RecipeOutput, RecipeJson
 from app.mapping.cmweb_template_mapper import map_nooko_recipe_to_cmweb_rows
 from app.services.cmweb_import_service import import_nooko_rows_to_cmweb
-from db.connection import get_connection  # or your existing DB getter
+from app.services.media_enrichment import enrich_recipe_media, shutdown_pool as shutdown_media_pool
 
 
 SERVICE_ID = "recipe-convert-into-cmweb"
 
+# Uvicorn only attaches handlers to its own loggers; log through one of them
+# so startup timings actually reach the container logs.
+logger = logging.getLogger("uvicorn.error")
+
+
+async def _warm_up_pool(size: int, timeout: float) -> None:
+    """
+    Opens `size` pooled connections in parallel threads so the first
+    requests after a scale-out don't pay the connect cost. Bounded by
+    `timeout`; failures are logged, not raised: /health reports DB
+    reachability.
+    """
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                *(asyncio.to_thread(warm_up_connection) for _ in range(size)),
+                return_exceptions=True,
+            ),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        logger.warning("DB pool warm-up: not done after %ss, continuing startup", timeout)
+        return
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        logger.warning("DB pool warm-up: %d/%d connections failed: %s", len(failures), size, failures[0])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()  # fail fast on missing env vars
+    await _warm_up_pool(settings.pool_size, timeout=settings.warmup_timeout + 1)
+
+    app.state.startup = {
+        "import_ms": round(IMPORT_MS, 1),
+        "ready_ms": round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1),
+    }
+    logger.info("Startup: import %(import_ms)sms, ready %(ready_ms)sms", app.state.startup)
+    yield
+    shutdown_media_pool()
+    close_pool()
+
+
 app = FastAPI(
     title="Recipe Import (Nooko into CMWeb)",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 @app.post("/recipes/import/nooko-to-cmweb")
-def import_recipe(payload: RecipeOutput):
+def import_recipe(payload: RecipeOutput, enrich_media: bool = False):
     if not payload.is_recipe:
         return {"imported": False, "reply": payload.response_plain}
 
     recipe: RecipeJson = payload.recipe_json
+    media_report = enrich_recipe_media(recipe) if enrich_media else None
     rows = map_nooko_recipe_to_cmweb_rows(recipe)
 
-    with get_connection() as conn:
+    with db_connection() as conn:
         id_main = import_nooko_rows_to_cmweb(
             conn=conn,
             rows=rows,
@@ -38,12 +91,19 @@ def import_recipe(payload: RecipeOutput):
             site_language=1,
         )
 
-    return {"imported": True, "idMain": id_main, "staged_rows": len(rows)}
+    response = {"imported": True, "idMain": id_main, "staged_rows": len(rows)}
+    if media_report is not None:
+        response["media"] = media_report.model_dump()
+    return response
 
 
 @app.get("/")
 def read_root():
-    return {"service": SERVICE_ID, "status": "running"}
+    return {
+        "service": SERVICE_ID,
+        "status": "running",
+        "startup": getattr(app.state, "startup", None),
+    }
 
 
 @app.get("/health")
@@ -96,3 +156,6 @@ def recipe_convert_into_cmc(req: ConvertRequest):
         )
 
 
+# Module import cost (up to the app being constructed); ready_ms in the
+# lifespan adds settings load and pool warm-up on top.
+IMPORT_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
@@ -1,7 +1,6 @@
 from __future__ import annotations
 from urllib.parse import urlparse
 from typing import Any, Dict, List
-import pyodbc
 
 
 def map_nooko_to_cmc(nooko_json: Dict[str, Any]) -> List[Dict[str, Any]]:
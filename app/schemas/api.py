@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
 
@@ -34,4 +34,29 @@ class ConvertResponse(BaseModel):
     success: bool
     message: str
     result: Dict[str, Any]
-    API_Usage: APIUsage                
\ No newline at end of file
+    API_Usage: APIUsage                
+
+class MediaStatus(str, Enum):
+    extracted = "extracted"
+    cached = "cached"
+    skipped = "skipped"  # remote media, not resolved
+    rejected = "rejected"  # local path outside MEDIA_ROOT (or no root configured)
+    timeout = "timeout"
+    error = "error"
+
+class MediaExtraction(BaseModel):
+    url: str
+    status: MediaStatus
+    latency_ms: float
+    width: Optional[float] = None
+    height: Optional[float] = None
+    format: Optional[str] = None
+    size_bytes: Optional[float] = None
+
+class MediaEnrichmentReport(BaseModel):
+    items: List[MediaExtraction] = []
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_hit_rate: float = 0.0
+    elapsed_ms: float = 0.0
+    budget_exhausted: bool = False
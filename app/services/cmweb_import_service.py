@@ -1,7 +1,9 @@
 from __future__ import annotations
 
-from typing import List, Tuple, Optional
-import pyodbc
+from typing import TYPE_CHECKING, List, Tuple, Optional
+
+if TYPE_CHECKING:
+    import pyodbc
 
 TemplateRow = Tuple[str, str, str, str, str, str, str, str]
 
@@ -0,0 +1,442 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, Executor, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlparse
+
+from app.schemas.api import MediaEnrichmentReport, MediaExtraction, MediaStatus
+from app.schemas.nooko_recipe_output import MediaItem, RecipeJson
+
+# (width, height, format, size_bytes, extraction_ms)
+ImageHeader = Tuple[int, int, Optional[str], int, float]
+# (realpath, mtime_ns)
+CacheKey = Tuple[str, int]
+
+DEFAULT_BUDGET_S = 2.0
+CACHE_MAX_ENTRIES = 2048
+# How long a retired pool may keep running, so late results still land in
+# the cache, before its workers are killed.
+RETIRED_POOL_GRACE_S = 30.0
+# Retired pools still alive at once. Past this, a wedged pool is not
+# replaced and its requests' items time out without being submitted.
+MAX_RETIRED_POOLS = 2
+# How often in-flight tasks are checked while waiting, to date when they
+# started running.
+_POLL_S = 0.05
+
+# Cached value for files Pillow could not decode (keyed by mtime, so a
+# fixed file is retried).
+_UNREADABLE = None
+_MISS = object()
+
+_cache: "OrderedDict[CacheKey, Optional[ImageHeader]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+_pool: Optional[Executor] = None
+_retired: Set[Executor] = set()
+_pool_lock = threading.Lock()
+
+# future -> [pool, first time it was seen running (None until then)]
+_inflight: Dict[Future, List[Any]] = {}
+_inflight_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class MediaSettings:
+    # Only files under this directory are read. None disables local media.
+    root: Optional[str]
+
+
+@lru_cache(maxsize=1)
+def get_media_settings() -> MediaSettings:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    root = os.getenv("MEDIA_ROOT")
+    return MediaSettings(root=os.path.realpath(root) if root else None)
+
+
+def _within_root(path: str, root: str, resolve: bool = True) -> Optional[str]:
+    # Relative paths are taken from root. With resolve, symlinks are
+    # followed before the containment check; without, only ".." is.
+    joined = os.path.join(root, path)
+    real = os.path.realpath(joined) if resolve else os.path.normpath(joined)
+    try:
+        if os.path.commonpath([root, real]) != root:
+            return None
+    except ValueError:  # different drives on Windows
+        return None
+    return real
+
+
+def _stat_media(path: str, root: str) -> Optional[Tuple[str, int, bool]]:
+    """
+    Runs in a worker process: realpath and stat can block on a hung mount
+    just like a read. Returns (realpath, mtime_ns, is_regular_file), or
+    None when the path resolves outside root (not stat'ed at all).
+    """
+    real = _within_root(path, root)
+    if real is None:
+        return None
+    st = os.stat(real)
+    return real, st.st_mtime_ns, stat.S_ISREG(st.st_mode)
+
+
+def _read_image_header(path: str) -> ImageHeader:
+    """
+    Runs in a worker process. Image.open is lazy: it parses the header
+    for size/format and does not decode pixel data.
+    """
+    from PIL import Image
+
+    started = time.perf_counter()
+    with Image.open(path) as img:
+        width, height = img.size
+        fmt = img.format.lower() if img.format else None
+    size_bytes = os.path.getsize(path)
+    return width, height, fmt, size_bytes, (time.perf_counter() - started) * 1000
+
+
+def _get_pool() -> Executor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Never fork: this is called from uvicorn's threadpool.
+            _pool = ProcessPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _pool
+
+
+def _kill_pool(pool: Executor) -> None:
+    # There is no public way to stop a running task, so kill the workers:
+    # a read stuck on a hung mount would otherwise pin them (and block
+    # interpreter exit, which joins them).
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+    with _pool_lock:
+        _retired.discard(pool)
+
+
+def _retire_pool(pool: Executor, grace_s: float = 0.0) -> bool:
+    """
+    Detaches `pool` so the next call builds a fresh one, and kills its
+    workers after `grace_s`. A graceful retirement is refused (False) once
+    MAX_RETIRED_POOLS are already waiting out their grace period.
+    """
+    global _pool
+    with _pool_lock:
+        if pool in _retired:
+            return True
+        if grace_s > 0 and len(_retired) >= MAX_RETIRED_POOLS:
+            return False
+        if _pool is pool:
+            _pool = None
+        _retired.add(pool)
+    if grace_s <= 0:
+        _kill_pool(pool)
+        return True
+    timer = threading.Timer(grace_s, _kill_pool, args=(pool,))
+    timer.daemon = True
+    timer.start()
+    return True
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pools = [p for p in (_pool, *_retired) if p is not None]
+        _pool = None
+    for pool in pools:
+        _kill_pool(pool)
+
+
+def _track(pool: Executor, future: Future) -> None:
+    with _inflight_lock:
+        _inflight[future] = [pool, None]
+    future.add_done_callback(_untrack)
+
+
+def _untrack(future: Future) -> None:
+    with _inflight_lock:
+        _inflight.pop(future, None)
+
+
+def _observe_running() -> None:
+    now = time.monotonic()
+    with _inflight_lock:
+        for future, entry in _inflight.items():
+            if entry[1] is None and future.running():
+                entry[1] = now
+
+
+def _has_overdue_task(pool: Executor, limit_s: float) -> bool:
+    # Start times are when a task was first seen running, so this
+    # undercounts: a healthy pool that is merely busy is never flagged.
+    now = time.monotonic()
+    with _inflight_lock:
+        return any(
+            p is pool and started is not None and now - started > limit_s
+            for p, started in _inflight.values()
+        )
+
+
+def _acquire_pool(limit_s: float) -> Optional[Executor]:
+    """
+    Returns the shared pool, replacing it first if one of its tasks has
+    been running longer than limit_s. None if it is wedged and can't be
+    replaced because too many retired pools are still alive.
+    """
+    pool = _get_pool()
+    _observe_running()
+    if not _has_overdue_task(pool, limit_s):
+        return pool
+    if not _retire_pool(pool, RETIRED_POOL_GRACE_S):
+        return None
+    return _get_pool()
+
+
+def _cache_get(key: CacheKey):
+    with _cache_lock:
+        header = _cache.get(key, _MISS)
+        if header is not _MISS:
+            _cache.move_to_end(key)
+        return header
+
+
+def _cache_put(key: CacheKey, header: Optional[ImageHeader]) -> None:
+    with _cache_lock:
+        _cache[key] = header
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _cache_result(key: CacheKey, future: Future) -> None:
+    # Done callback, so results arriving after the deadline are kept too.
+    # Only decode failures are cached; OS errors (permissions, I/O) may be
+    # fixed without touching mtime.
+    from PIL import Image, UnidentifiedImageError
+
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is None:
+        _cache_put(key, future.result())
+    elif isinstance(exc, (UnidentifiedImageError, SyntaxError, Image.DecompressionBombError)):
+        _cache_put(key, _UNREADABLE)
+
+
+def _run_until(
+    pool: Executor,
+    fn: Callable,
+    args_by_key: Dict[Any, tuple],
+    deadline: float,
+    on_done: Optional[Callable[[Any, Future], None]] = None,
+) -> Tuple[Dict[Any, Any], Set[Any], Set[Any]]:
+    """
+    Runs fn(*args) per key in `pool` until all finish or the deadline.
+    Returns (results, failed keys, timed-out keys). If the pool can't take
+    work (broken, or shut down by another request), every key fails and
+    the pool is retired.
+    """
+    results: Dict[Any, Any] = {}
+    failed: Set[Any] = set()
+    futures: Dict[Future, Any] = {}
+    try:
+        for key, args in args_by_key.items():
+            future = pool.submit(fn, *args)
+            _track(pool, future)
+            if on_done is not None:
+                future.add_done_callback(partial(on_done, key))
+            futures[future] = key
+    except RuntimeError:  # BrokenExecutor, or "cannot schedule new futures after shutdown"
+        _retire_pool(pool)
+        for future in futures:
+            future.cancel()
+        return results, set(args_by_key), set()
+
+    not_done = set(futures)
+    while not_done:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        done, not_done = wait(not_done, timeout=min(remaining, _POLL_S), return_when=FIRST_COMPLETED)
+        _observe_running()
+        for future in done:
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except BrokenExecutor:
+                _retire_pool(pool)
+                failed.add(key)
+            except Exception:
+                failed.add(key)
+
+    for future in not_done:
+        # Queued work is dropped; a running task is left to finish (its
+        # result is still cached) or to be found overdue by a later call.
+        future.cancel()
+    return results, failed, {futures[f] for f in not_done}
+
+
+def _local_path(url: str) -> Optional[str]:
+    """
+    Returns the path for file:// URLs and bare paths, None for remote
+    media (http, https, data, ...).
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return unquote(parsed.path)
+    # len(scheme) == 1 is a Windows drive letter, e.g. C:\images\a.png
+    if not parsed.scheme or len(parsed.scheme) == 1:
+        return url
+    return None
+
+
+def _apply(item: MediaItem, header: ImageHeader) -> None:
+    # Only fill gaps; values sent upstream win.
+    width, height, fmt, size_bytes, _ = header
+    if item.width is None:
+        item.width = float(width)
+    if item.height is None:
+        item.height = float(height)
+    if item.format is None:
+        item.format = fmt
+    if item.size_bytes is None:
+        item.size_bytes = float(size_bytes)
+
+
+def _entry(item: MediaItem, status: MediaStatus, latency_ms: float = 0.0) -> MediaExtraction:
+    entry = MediaExtraction(url=item.url, status=status, latency_ms=round(latency_ms, 2))
+    if status in (MediaStatus.extracted, MediaStatus.cached):
+        entry.width = item.width
+        entry.height = item.height
+        entry.format = item.format
+        entry.size_bytes = item.size_bytes
+    return entry
+
+
+def enrich_recipe_media(
+    recipe: RecipeJson,
+    budget_s: float = DEFAULT_BUDGET_S,
+) -> MediaEnrichmentReport:
+    """
+    Fills width/height/format/size_bytes on recipe.images and
+    recipe.infographics from the headers of files under MEDIA_ROOT.
+
+    All filesystem work (resolve, stat, header read) runs in a process
+    pool within budget_s; headers are cached by (path, mtime). Anything
+    not finished in time is left as-is and reported as "timeout", so
+    slow media never stalls the import. The report has one entry per
+    item, in input order.
+    """
+    started = time.perf_counter()
+    deadline = started + budget_s
+    root = get_media_settings().root
+    report = MediaEnrichmentReport()
+
+    items: List[MediaItem] = [*recipe.images, *recipe.infographics]
+    entries: List[Optional[MediaExtraction]] = [None] * len(items)
+
+    def _elapsed_ms() -> float:
+        return (time.perf_counter() - started) * 1000
+
+    # Local paths that pass a lexical root check, grouped so each is
+    # stat'ed once.
+    paths: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        path = _local_path(item.url)
+        if path is None:
+            entries[i] = _entry(item, MediaStatus.skipped)
+        elif not root or _within_root(path, root, resolve=False) is None:
+            entries[i] = _entry(item, MediaStatus.rejected)
+        else:
+            paths.setdefault(path, []).append(i)
+
+    if paths:
+        pool = _acquire_pool(budget_s)
+        if pool is None:
+            report.budget_exhausted = True
+            for indices in paths.values():
+                for i in indices:
+                    entries[i] = _entry(items[i], MediaStatus.timeout, _elapsed_ms())
+            paths = {}
+    else:
+        pool = None
+
+    # One header read per (path, mtime), even if several items share it.
+    pending: Dict[CacheKey, List[int]] = {}
+    hit_keys: Set[CacheKey] = set()
+    if paths:
+        stats, failed, timed_out = _run_until(
+            pool, _stat_media, {p: (p, root) for p in paths}, deadline
+        )
+        for path, indices in paths.items():
+            if path in timed_out:
+                report.budget_exhausted = True
+                for i in indices:
+                    entries[i] = _entry(items[i], MediaStatus.timeout, _elapsed_ms())
+                continue
+            result = stats.get(path)
+            if result is None:
+                status = MediaStatus.error if path in failed else MediaStatus.rejected
+                for i in indices:
+                    entries[i] = _entry(items[i], status)
+                continue
+            real, mtime_ns, is_regular = result
+            if not is_regular:  # FIFOs, devices: a read could block forever
+                for i in indices:
+                    entries[i] = _entry(items[i], MediaStatus.error)
+                continue
+            key = (real, mtime_ns)
+            if key in pending:
+                pending[key].extend(indices)
+                continue
+            header = _cache_get(key)
+            if header is _MISS:
+                pending[key] = list(indices)
+                continue
+            hit_keys.add(key)
+            for i in indices:
+                if header is _UNREADABLE:
+                    entries[i] = _entry(items[i], MediaStatus.error)
+                else:
+                    _apply(items[i], header)
+                    entries[i] = _entry(items[i], MediaStatus.cached)
+
+    report.cache_hits = len(hit_keys)
+    report.cache_misses = len(pending)
+
+    if pending:
+        headers, failed, timed_out = _run_until(
+            pool, _read_image_header, {key: (key[0],) for key in pending}, deadline, on_done=_cache_result
+        )
+        for key, indices in pending.items():
+            header = headers.get(key)
+            for i in indices:
+                if header is not None:
+                    _apply(items[i], header)
+                    entries[i] = _entry(items[i], MediaStatus.extracted, header[4])
+                elif key in timed_out:
+                    report.budget_exhausted = True
+                    entries[i] = _entry(items[i], MediaStatus.timeout, _elapsed_ms())
+                else:
+                    entries[i] = _entry(items[i], MediaStatus.error)
+
+    report.items = entries
+    lookups = report.cache_hits + report.cache_misses
+    report.cache_hit_rate = round(report.cache_hits / lookups, 4) if lookups else 0.0
+    report.elapsed_ms = round(_elapsed_ms(), 2)
+    return report
@@ -1,8 +1,15 @@
+from __future__ import annotations
+
 import os
-import pyodbc
-from dotenv import load_dotenv
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pyodbc
 
-load_dotenv()
 
 def _required_env(name: str) -> str:
     value = os.getenv(name)
@@ -11,21 +18,134 @@ def _required_env(name: str) -> str:
     return value
 
 
-DB_SERVER = _required_env("DB_SERVER")
-DB_PORT = _required_env("DB_PORT")
-DB_NAME = _required_env("DB_NAME")
-DB_USER = _required_env("DB_USER")
-DB_PASSWORD = _required_env("DB_PASSWORD")
-DB_DRIVER = _required_env("DB_DRIVER")
+@dataclass(frozen=True)
+class DBSettings:
+    server: str
+    port: str
+    name: str
+    user: str
+    password: str = field(repr=False)
+    driver: str
+    # Idle connections kept open for reuse; also how many are opened at startup.
+    pool_size: int = 2
+    # Login timeout (seconds) for warm-up connections, so an unreachable DB
+    # can't hold startup for the driver's full default.
+    warmup_timeout: int = 5
+    # Idle connections older than this (seconds) are closed instead of reused.
+    pool_max_idle: int = 300
+
+    @property
+    def connection_string(self) -> str:
+        return (
+            f"DRIVER={{{self.driver}}};"
+            f"SERVER={self.server},{self.port};"
+            f"DATABASE={self.name};"
+            f"UID={self.user};"
+            f"PWD={self.password};"
+            "TrustServerCertificate=yes;"
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> DBSettings:
+    """
+    Loads DB settings from the environment (and .env) on first call only,
+    so importing this module stays free of env/IO work.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return DBSettings(
+        server=_required_env("DB_SERVER"),
+        port=_required_env("DB_PORT"),
+        name=_required_env("DB_NAME"),
+        user=_required_env("DB_USER"),
+        password=_required_env("DB_PASSWORD"),
+        driver=_required_env("DB_DRIVER"),
+        pool_size=int(os.getenv("DB_POOL_SIZE", "2")),
+        warmup_timeout=int(os.getenv("DB_WARMUP_TIMEOUT", "5")),
+        pool_max_idle=int(os.getenv("DB_POOL_MAX_IDLE", "300")),
+    )
+
+
+# App-side pool of idle connections. unixODBC only pools when Pooling=Yes is
+# set in odbcinst.ini, so pyodbc.pooling alone can't be relied on.
+# Entries are (connection, monotonic time it was released).
+_idle: list[tuple[pyodbc.Connection, float]] = []
+_idle_lock = threading.Lock()
+
+
+def _connect(timeout: int = 0) -> pyodbc.Connection:
+    import pyodbc
+
+    return pyodbc.connect(get_settings().connection_string, timeout=timeout)
+
+
+def _close_quietly(conn: pyodbc.Connection) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn: pyodbc.Connection) -> bool:
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
 
-CONNECTION_STRING = (
-    f"DRIVER={{{DB_DRIVER}}};"
-    f"SERVER={DB_SERVER},{DB_PORT};"
-    f"DATABASE={DB_NAME};"
-    f"UID={DB_USER};"
-    f"PWD={DB_PASSWORD};"
-    "TrustServerCertificate=yes;"
-)
 
 def get_connection() -> pyodbc.Connection:
-    return pyodbc.connect(CONNECTION_STRING)
+    """
+    Returns an idle pooled connection if there is a live one, else a new one.
+    Idle connections past pool_max_idle, or that fail a SELECT 1 (dropped by
+    the server or a failover), are closed and skipped.
+    Hand it back with release_connection() (or close it if it failed).
+    """
+    max_idle = get_settings().pool_max_idle
+    while True:
+        with _idle_lock:
+            if not _idle:
+                break
+            conn, released_at = _idle.pop()
+        if time.monotonic() - released_at <= max_idle and _is_alive(conn):
+            return conn
+        _close_quietly(conn)
+    return _connect()
+
+
+def release_connection(conn: pyodbc.Connection) -> None:
+    with _idle_lock:
+        if len(_idle) < get_settings().pool_size:
+            _idle.append((conn, time.monotonic()))
+            return
+    _close_quietly(conn)
+
+
+def warm_up_connection() -> None:
+    """
+    Opens one connection (with the short warm-up login timeout) and parks
+    it in the idle pool.
+    """
+    release_connection(_connect(timeout=get_settings().warmup_timeout))
+
+
+def close_pool() -> None:
+    with _idle_lock:
+        conns = [conn for conn, _ in _idle]
+        _idle.clear()
+    for conn in conns:
+        _close_quietly(conn)
+
+
+def __getattr__(name: str) -> str:
+    # Backwards compatibility for callers still importing CONNECTION_STRING.
+    if name == "CONNECTION_STRING":
+        return get_settings().connection_string
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,37 @@
 from contextlib import contextmanager
-from db.connection import get_connection
+from db.connection import get_connection, release_connection
 
 
 @contextmanager
-def db_cursor():
+def db_connection():
+    """
+    Borrows a pooled connection. It goes back to the pool on success and is
+    closed on error, so a broken connection is never reused.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
-
     try:
-        yield cursor
-        conn.commit()
+        yield conn
     except Exception:
-        conn.rollback()
+        # Often the connection is already dead here; don't let the close
+        # error replace the original one.
+        try:
+            conn.close()
+        except Exception:
+            pass
         raise
-    finally:
-        cursor.close()
-        conn.close()
+    release_connection(conn)
+
+
+@contextmanager
+def db_cursor():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
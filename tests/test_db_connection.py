@@ -0,0 +1,170 @@
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+from db import connection, session
+
+DB_ENV = {
+    "DB_SERVER": "sql.example.com",
+    "DB_PORT": "1433",
+    "DB_NAME": "cmweb",
+    "DB_USER": "importer",
+    "DB_PASSWORD": "s3cret",
+    "DB_DRIVER": "ODBC Driver 18 for SQL Server",
+}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+        self.fail_close = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def execute(self, sql, *params):
+                if not conn.alive:
+                    raise RuntimeError("connection dropped")
+
+            def fetchone(self):
+                return (1,)
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        if self.fail_close:
+            raise RuntimeError("close on dead connection")
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pyodbc(monkeypatch):
+    for name, value in DB_ENV.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv("DB_POOL_SIZE", "2")
+    connection.get_settings.cache_clear()
+    connection._idle.clear()
+
+    module = types.SimpleNamespace(opened=[], calls=[])
+
+    def connect(conn_str, timeout=0):
+        module.calls.append((conn_str, timeout))
+        conn = FakeConnection()
+        module.opened.append(conn)
+        return conn
+
+    module.connect = connect
+    monkeypatch.setitem(sys.modules, "pyodbc", module)
+    yield module
+    connection._idle.clear()
+    connection.get_settings.cache_clear()
+
+
+def test_import_without_env_does_not_raise():
+    env = {k: v for k, v in os.environ.items() if not k.startswith("DB_")}
+    code = (
+        "import sys, db.connection\n"
+        "assert 'pyodbc' not in sys.modules\n"
+        "assert 'dotenv' not in sys.modules\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_settings_are_loaded_lazily_and_cached(fake_pyodbc, monkeypatch):
+    settings = connection.get_settings()
+    assert connection.get_settings() is settings
+    assert settings.pool_size == 2
+    assert "s3cret" not in repr(settings)
+
+    monkeypatch.delenv("DB_SERVER")
+    connection.get_settings.cache_clear()
+    with pytest.raises(RuntimeError, match="Missing env var: DB_SERVER"):
+        connection.get_settings()
+
+
+def test_connection_string_shim(fake_pyodbc):
+    assert connection.CONNECTION_STRING == connection.get_settings().connection_string
+    assert "SERVER=sql.example.com,1433;" in connection.CONNECTION_STRING
+    with pytest.raises(AttributeError):
+        connection.NOT_A_SETTING
+
+
+def test_release_caps_idle_pool_and_reuses(fake_pyodbc):
+    conns = [connection.get_connection() for _ in range(3)]
+    for conn in conns:
+        connection.release_connection(conn)
+
+    assert len(connection._idle) == 2
+    assert conns[2].closed and not conns[0].closed
+
+    assert connection.get_connection() is conns[1]
+    assert len(fake_pyodbc.opened) == 3
+
+
+def test_dead_or_expired_idle_connections_are_replaced(fake_pyodbc, monkeypatch):
+    dead = connection.get_connection()
+    connection.release_connection(dead)
+    dead.alive = False
+
+    conn = connection.get_connection()
+    assert conn is not dead and dead.closed
+
+    connection.release_connection(conn)
+    monkeypatch.setenv("DB_POOL_MAX_IDLE", "0")
+    connection.get_settings.cache_clear()
+    monkeypatch.setattr(connection.time, "monotonic", lambda: float("inf"))
+
+    fresh = connection.get_connection()
+    assert fresh is not conn and conn.closed
+    assert len(fake_pyodbc.opened) == 3
+
+
+def test_warm_up_parks_connection_with_login_timeout(fake_pyodbc):
+    connection.warm_up_connection()
+    assert fake_pyodbc.calls[0][1] == connection.get_settings().warmup_timeout
+    assert len(connection._idle) == 1
+
+
+def test_db_connection_releases_on_success_closes_on_error(fake_pyodbc):
+    with session.db_cursor() as cursor:
+        cursor.execute("SELECT 1")
+    ok = fake_pyodbc.opened[0]
+    assert ok.commits == 1 and not ok.closed
+    assert connection._idle[0][0] is ok
+
+    connection._idle.clear()
+    with pytest.raises(ValueError):
+        with session.db_connection() as conn:
+            conn.fail_close = True
+            raise ValueError("original error")
+    assert not connection._idle
+
+
+def test_close_pool_closes_idle_connections(fake_pyodbc):
+    conns = [connection.get_connection() for _ in range(2)]
+    for conn in conns:
+        connection.release_connection(conn)
+    conns[0].fail_close = True
+
+    connection.close_pool()
+
+    assert not connection._idle
+    assert conns[1].closed
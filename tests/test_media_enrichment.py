@@ -0,0 +1,261 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from app.schemas.api import MediaStatus
+from app.schemas.nooko_recipe_output import MediaItem, RecipeJson
+from app.services import media_enrichment
+
+
+def _media(url: str) -> MediaItem:
+    return MediaItem(
+        url=url, name=None, alt="", caption=None, width=None, height=None,
+        format=None, size_bytes=None, type=None, step_index=None, attribution=None,
+        license=None, copyright=None, seo_keywords=None, created_at=None, uploaded_by=None,
+    )
+
+
+def _recipe(*urls: str, infographics=()) -> RecipeJson:
+    return RecipeJson.model_construct(
+        images=[_media(u) for u in urls],
+        infographics=[_media(u) for u in infographics],
+    )
+
+
+@pytest.fixture
+def media_root(tmp_path, monkeypatch):
+    root = tmp_path / "media"
+    root.mkdir()
+    monkeypatch.setenv("MEDIA_ROOT", str(root))
+    media_enrichment.get_media_settings.cache_clear()
+    media_enrichment._cache.clear()
+    yield root
+    media_enrichment.shutdown_pool()
+    media_enrichment.get_media_settings.cache_clear()
+    media_enrichment._cache.clear()
+
+
+def _use_pool(pool):
+    # Set directly (not via monkeypatch) so fixture teardown's shutdown_pool()
+    # is the last word on _pool.
+    media_enrichment.shutdown_pool()
+    media_enrichment._pool = pool
+
+
+def _png(path, size=(40, 30)):
+    Image.new("RGB", size).save(path)
+    return str(path)
+
+
+def test_extracts_then_hits_cache_until_mtime_changes(media_root):
+    path = _png(media_root / "a.png")
+
+    recipe = _recipe("a.png", f"file://{path}")
+    report = media_enrichment.enrich_recipe_media(recipe, budget_s=30)
+    assert [e.status for e in report.items] == [MediaStatus.extracted, MediaStatus.extracted]
+    assert (report.cache_hits, report.cache_misses) == (0, 1)
+    assert (recipe.images[0].width, recipe.images[0].height, recipe.images[0].format) == (40.0, 30.0, "png")
+    assert report.items[1].width == 40.0
+
+    report = media_enrichment.enrich_recipe_media(_recipe("a.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.cached
+    assert report.cache_hit_rate == 1.0
+
+    _png(path, size=(80, 60))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    recipe = _recipe("a.png")
+    report = media_enrichment.enrich_recipe_media(recipe, budget_s=30)
+    assert report.items[0].status == MediaStatus.extracted
+    assert recipe.images[0].width == 80.0
+
+
+def test_remote_and_out_of_root_paths_are_not_read(media_root, tmp_path):
+    outside = _png(tmp_path / "outside.png")
+    os.symlink(outside, media_root / "link.png")
+    os.symlink(tmp_path / "missing.png", media_root / "dangling.png")
+
+    recipe = _recipe(
+        "https://cdn.example.com/a.png",
+        outside,
+        f"file://{outside}",
+        "../outside.png",
+        "link.png",
+        "dangling.png",
+        "/etc/shadow",
+    )
+    report = media_enrichment.enrich_recipe_media(recipe, budget_s=30)
+
+    assert [e.status for e in report.items] == [MediaStatus.skipped] + [MediaStatus.rejected] * 6
+    assert all(e.size_bytes is None for e in report.items)
+    assert (report.cache_hits, report.cache_misses) == (0, 0)
+
+
+def test_local_media_rejected_without_media_root(media_root, monkeypatch):
+    _png(media_root / "a.png")
+    monkeypatch.delenv("MEDIA_ROOT")
+    media_enrichment.get_media_settings.cache_clear()
+
+    report = media_enrichment.enrich_recipe_media(_recipe(str(media_root / "a.png")))
+    assert report.items[0].status == MediaStatus.rejected
+    assert media_enrichment._pool is None
+
+
+def test_missing_file_reports_generic_error(media_root):
+    report = media_enrichment.enrich_recipe_media(_recipe("missing.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.error
+    assert report.cache_misses == 0
+
+
+def test_decode_failures_are_cached_os_errors_are_not(media_root, monkeypatch):
+    (media_root / "bad.png").write_bytes(b"not an image")
+    report = media_enrichment.enrich_recipe_media(_recipe("bad.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.error
+    report = media_enrichment.enrich_recipe_media(_recipe("bad.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.error
+    assert report.cache_hits == 1
+
+    _png(media_root / "locked.png")
+    calls = []
+
+    def read_header(path):
+        calls.append(path)
+        if len(calls) == 1:
+            raise PermissionError(13, "Permission denied", path)
+        return 40, 30, "png", 1, 0.5
+
+    monkeypatch.setattr(media_enrichment, "_read_image_header", read_header)
+    _use_pool(ThreadPoolExecutor(max_workers=1))
+    report = media_enrichment.enrich_recipe_media(_recipe("locked.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.error
+    report = media_enrichment.enrich_recipe_media(_recipe("locked.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.extracted
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def thread_pools(monkeypatch):
+    """Swaps the process pool for thread pools so workers can be patched."""
+    release = threading.Event()
+    monkeypatch.setattr(
+        media_enrichment, "ProcessPoolExecutor", lambda **kwargs: ThreadPoolExecutor(max_workers=1)
+    )
+    yield release
+    release.set()
+
+
+def test_hung_stat_is_bounded_by_budget(media_root, monkeypatch, thread_pools):
+    def stat_media(path, root):
+        thread_pools.wait(10)
+
+    monkeypatch.setattr(media_enrichment, "_stat_media", stat_media)
+    started = time.perf_counter()
+    report = media_enrichment.enrich_recipe_media(_recipe("a.png"), budget_s=0.2)
+
+    assert time.perf_counter() - started < 2
+    assert report.items[0].status == MediaStatus.timeout
+    assert report.budget_exhausted
+
+
+def test_timeout_is_reported_in_order_and_late_result_is_cached(media_root, monkeypatch):
+    _png(media_root / "ok.png")
+    _png(media_root / "slow.png")
+    release = threading.Event()
+
+    def read_header(path):
+        if path.endswith("slow.png"):
+            release.wait(10)
+        return 40, 30, "png", 1, 0.5
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(media_enrichment, "_read_image_header", read_header)
+    _use_pool(pool)
+
+    report = media_enrichment.enrich_recipe_media(_recipe("slow.png", "ok.png", "slow.png"), budget_s=0.3)
+
+    assert [e.status for e in report.items] == [MediaStatus.timeout, MediaStatus.extracted, MediaStatus.timeout]
+    assert report.budget_exhausted
+    assert report.cache_misses == 2
+    # Still running at the deadline is not enough to retire the pool.
+    assert media_enrichment._pool is pool
+
+    release.set()
+    pool.shutdown(wait=True)
+    key = (str(media_root / "slow.png"), os.stat(media_root / "slow.png").st_mtime_ns)
+    assert media_enrichment._cache_get(key) == (40, 30, "png", 1, 0.5)
+
+
+def test_overdue_pool_is_retired_up_to_cap(media_root, monkeypatch, thread_pools):
+    _png(media_root / "slow.png")
+    calls = []
+
+    def read_header(path):
+        calls.append(path)
+        thread_pools.wait(10)
+        return 40, 30, "png", 1, 0.5
+
+    monkeypatch.setattr(media_enrichment, "_read_image_header", read_header)
+    monkeypatch.setattr(media_enrichment, "MAX_RETIRED_POOLS", 1)
+
+    media_enrichment.enrich_recipe_media(_recipe("slow.png"), budget_s=0.2)
+    first = media_enrichment._pool
+    time.sleep(0.3)
+
+    # first has a task running longer than the budget: replaced.
+    report = media_enrichment.enrich_recipe_media(_recipe("slow.png"), budget_s=0.2)
+    assert report.items[0].status == MediaStatus.timeout
+    second = media_enrichment._pool
+    assert second is not first and media_enrichment._retired == {first}
+    time.sleep(0.3)
+
+    # second is overdue too, but the cap is reached: nothing is submitted.
+    report = media_enrichment.enrich_recipe_media(_recipe("slow.png"), budget_s=0.2)
+    assert report.items[0].status == MediaStatus.timeout
+    assert media_enrichment._pool is second and media_enrichment._retired == {first}
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize(
+    "error",
+    [BrokenProcessPool("worker died"), RuntimeError("cannot schedule new futures after shutdown")],
+)
+def test_unusable_pool_reports_error_and_is_replaced(media_root, mocker, monkeypatch, error):
+    _png(media_root / "a.png")
+    broken = mocker.Mock(spec=ProcessPoolExecutor)
+    broken.submit.side_effect = error
+    _use_pool(broken)
+
+    report = media_enrichment.enrich_recipe_media(_recipe("a.png", "a.png"))
+    assert [e.status for e in report.items] == [MediaStatus.error, MediaStatus.error]
+    assert media_enrichment._pool is None
+    broken.shutdown.assert_called()
+
+    report = media_enrichment.enrich_recipe_media(_recipe("a.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.extracted
+
+
+def test_recovers_after_worker_is_killed(media_root):
+    _png(media_root / "a.png")
+    _png(media_root / "b.png")
+    media_enrichment.enrich_recipe_media(_recipe("a.png"), budget_s=30)
+
+    pool = media_enrichment._pool
+    for process in list(pool._processes.values()):
+        process.kill()
+        process.join()
+    # Wait until the executor itself has noticed the dead worker.
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os.getpid).result(timeout=30)
+
+    report = media_enrichment.enrich_recipe_media(_recipe("b.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.error
+    assert media_enrichment._pool is None
+
+    report = media_enrichment.enrich_recipe_media(_recipe("b.png"), budget_s=30)
+    assert report.items[0].status == MediaStatus.extracted
+    assert media_enrichment._pool is not pool